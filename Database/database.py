@@ -1,7 +1,32 @@
+import os
 import sqlite3 as sqlite
+import threading
+import queue
+import time
+from concurrent.futures import Future
 from datetime import datetime
+
+from clock import DEFAULT_TIMEZONE, local_to_epoch
 DATABASE_NAME = 'schedule_assistant.db'
 
+# Sự kiện đã kết thúc quá số ngày này sẽ được chuyển sang bảng events_archive
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+ARCHIVE_BATCH_SIZE = 500
+
+EVENT_COLUMNS = ("id, event, start_time, end_time, location, reminder_minutes, "
+                 "is_notified, created_at, timezone, start_ts, end_ts")
+
+# Bộ đếm phiên bản dữ liệu nằm ngay trong database (bảng data_version) và được tăng
+# trong cùng transaction với mỗi lần ghi (thêm/sửa/xóa/lưu trữ), nên các cache phía trên
+# (vd: payload lịch trong app.py) thấy cả thay đổi do process khác thực hiện.
+def _bump_data_version(cursor):
+    cursor.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+
+def get_data_version() -> int:
+    with get_db_connection() as connection:
+        row = connection.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
 def get_db_connection():
     connection = sqlite.connect(DATABASE_NAME)
     connection.row_factory = sqlite.Row
@@ -10,6 +35,15 @@ def get_db_connection():
 def init_db():
     with get_db_connection() as connection:
         cursor = connection.cursor()
+        # Chỉ có hiệu lực với database mới; database cũ cần compact_database(allow_full_vacuum=True)
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS data_version (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        version INTEGER NOT NULL
+                       )
+                       ''')
+        cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
         cursor.execute('''
                        CREATE TABLE IF NOT EXISTS events (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -19,79 +53,205 @@ def init_db():
                         location TEXT,
                         reminder_minutes INTEGER,
                         is_notified INTEGER DEFAULT 0,
-                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        timezone TEXT,
+                        start_ts INTEGER,
+                        end_ts INTEGER
+                       )
+                       ''')
+        _migrate_utc_columns(cursor)
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS events_archive (
+                        id INTEGER PRIMARY KEY,
+                        event TEXT NOT NULL,
+                        start_time TEXT NOT NULL,
+                        end_time TEXT,
+                        location TEXT,
+                        reminder_minutes INTEGER,
+                        is_notified INTEGER DEFAULT 0,
+                        created_at TEXT,
+                        timezone TEXT,
+                        start_ts INTEGER,
+                        end_ts INTEGER,
+                        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
                        )
                        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_archive_start_ts ON events_archive (start_ts)")
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS maintenance_state (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        last_run_ts INTEGER NOT NULL,
+                        claimed_until_ts INTEGER NOT NULL DEFAULT 0
+                       )
+                       ''')
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(maintenance_state)")}
+        if "claimed_until_ts" not in columns:
+            cursor.execute("ALTER TABLE maintenance_state ADD COLUMN claimed_until_ts INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("INSERT OR IGNORE INTO maintenance_state (id, last_run_ts) VALUES (1, 0)")
         connection.commit()
         print("Khoi tao database thanh cong!")
 
+def _migrate_utc_columns(cursor):
+    # Database cũ chỉ có start_time/end_time (giờ địa phương, không múi giờ):
+    # thêm cột timezone + epoch UTC và điền dữ liệu theo múi giờ mặc định.
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(events)")}
+    for column, column_type in (("timezone", "TEXT"), ("start_ts", "INTEGER"), ("end_ts", "INTEGER")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE events ADD COLUMN {column} {column_type}")
+
+    rows = cursor.execute(
+        "SELECT id, start_time, end_time, timezone FROM events WHERE start_ts IS NULL"
+    ).fetchall()
+    for event_id, start_time, end_time, tz_name in rows:
+        tz_name = tz_name or DEFAULT_TIMEZONE
+        cursor.execute(
+            "UPDATE events SET timezone = ?, start_ts = ?, end_ts = ? WHERE id = ?",
+            (tz_name, local_to_epoch(start_time, tz_name), local_to_epoch(end_time, tz_name), event_id)
+        )
+    if rows:
+        _bump_data_version(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_start_ts ON events (start_ts)")
+
+def _event_params(event_data: dict) -> dict:
+    # start_time/end_time là giờ địa phương theo `timezone` của sự kiện;
+    # start_ts/end_ts (epoch UTC) luôn được tính lại từ đó để hai dạng không lệch nhau.
+    tz_name = event_data.get("timezone") or DEFAULT_TIMEZONE
+    return {
+        "event": event_data.get("event"),
+        "start_time": event_data.get("start_time"),
+        "end_time": event_data.get("end_time"),
+        "location": event_data.get("location"),
+        "reminder_minutes": event_data.get("reminder_minutes"),
+        "timezone": tz_name,
+        "start_ts": local_to_epoch(event_data.get("start_time"), tz_name),
+        "end_ts": local_to_epoch(event_data.get("end_time"), tz_name)
+    }
+
+def _insert_event(cursor, event_data: dict):
+    cursor.execute('''
+                   INSERT INTO events (event, start_time, end_time, location, reminder_minutes,
+                                       timezone, start_ts, end_ts)
+                   VALUES (:event, :start_time, :end_time, :location, :reminder_minutes,
+                           :timezone, :start_ts, :end_ts)
+                   ''',
+                   _event_params(event_data)
+                   )
+    event_id = cursor.lastrowid
+    _bump_data_version(cursor)
+    return event_id
+
+def _update_event(cursor, event_id: int, updated_data: dict):
+    cursor.execute('''
+                   UPDATE events
+                   SET event = :event,
+                       start_time = :start_time,
+                       end_time = :end_time,
+                       location = :location,
+                       reminder_minutes = :reminder_minutes,
+                       timezone = :timezone,
+                       start_ts = :start_ts,
+                       end_ts = :end_ts
+                   WHERE id = :id
+                   ''',
+                   {**_event_params(updated_data), "id": event_id}
+                   )
+    _bump_data_version(cursor)
+
+def _delete_event(cursor, event_id: int):
+    cursor.execute(
+                    "DELETE FROM events WHERE id = ?",
+                    (event_id,)
+                   )
+    _bump_data_version(cursor)
+
 def add_event(event_data: dict):
+    writer = _group_writer
+    if writer is not None:
+        try:
+            future = writer.add_event(event_data)
+        except GroupCommitClosed:
+            future = None  # Writer vừa bị tắt: ghi trực tiếp như bình thường
+        if future is not None:
+            return future.result()
     with get_db_connection() as connection:
         cursor = connection.cursor()
-        cursor.execute('''
-                       INSERT INTO events (event, start_time, end_time, location, reminder_minutes)
-                       VALUES (:event, :start_time, :end_time, :location, :reminder_minutes)
-                       ''',
-                       {
-                           "event": event_data.get("event"),
-                           "start_time": event_data.get("start_time"),
-                           "end_time": event_data.get("end_time"),
-                           "location": event_data.get("location"),
-                           "reminder_minutes": event_data.get("reminder_minutes")
-                       }
-                       )
+        event_id = _insert_event(cursor, event_data)
         connection.commit()
-        return cursor.lastrowid
+        return event_id
     
-def get_events_for_range(start_date: str, end_date: str):
+def get_events_for_range(start_ts: int, end_ts: int):
+    # Các sự kiện giao với khoảng [start_ts, end_ts) (epoch UTC), giống cách FullCalendar
+    # yêu cầu dữ liệu cho một khung nhìn; sự kiện không có end_ts được tính là dài 1 giờ.
     with get_db_connection() as connection:
         cursor = connection.cursor()
         cursor.execute(
-                       "SELECT * FROM events WHERE start_time BETWEEN ? AND ?",
-                        (start_date, end_date)
+                       '''
+                       SELECT * FROM events
+                       WHERE start_ts < ? AND COALESCE(end_ts, start_ts + 3600) > ?
+                       ORDER BY start_ts ASC
+                       ''',
+                        (end_ts, start_ts)
                        )
         return [dict(row) for row in cursor.fetchall()]
 
+def get_event(event_id: int):
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT * FROM events WHERE id = ?", (event_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+def count_events() -> int:
+    with get_db_connection() as connection:
+        return connection.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+def get_events_page(offset: int, limit: int):
+    # Sự kiện mới nhất trước, dùng cho bảng danh sách có phân trang
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+                        "SELECT * FROM events ORDER BY start_ts DESC, id DESC LIMIT ? OFFSET ?",
+                        (limit, offset)
+                    )
+        return [dict(row) for row in cursor.fetchall()]
+
 def get_all_events():
     with get_db_connection() as connection:
         cursor = connection.cursor()
         cursor.execute(
-                        "SELECT * FROM events ORDER BY start_time ASC"
+                        "SELECT * FROM events ORDER BY start_ts ASC"
                     )
         return [dict(row) for row in cursor.fetchall()]
 
 def delete_event(event_id: int):
+    writer = _group_writer
+    if writer is not None:
+        try:
+            future = writer.delete_event(event_id)
+        except GroupCommitClosed:
+            future = None  # Writer vừa bị tắt: ghi trực tiếp như bình thường
+        if future is not None:
+            return future.result()
     with get_db_connection() as connection:
         cursor = connection.cursor()
-        cursor.execute(
-                        "DELETE FROM events WHERE id = ?",
-                        (event_id,)
-                       ) 
+        _delete_event(cursor, event_id)
         connection.commit()
 
 def update_event(event_id: int, updated_data: dict):
+    writer = _group_writer
+    if writer is not None:
+        try:
+            future = writer.update_event(event_id, updated_data)
+        except GroupCommitClosed:
+            future = None  # Writer vừa bị tắt: ghi trực tiếp như bình thường
+        if future is not None:
+            return future.result()
     with get_db_connection() as connection:
         cursor = connection.cursor()
-        cursor.execute('''
-                       UPDATE events
-                       SET event = :event,
-                           start_time = :start_time,
-                           end_time = :end_time,
-                           location = :location,
-                           reminder_minutes = :reminder_minutes
-                       WHERE id = :id
-                       ''',
-                       {
-                           "event": updated_data.get("event"),
-                           "start_time": updated_data.get("start_time"),
-                           "end_time": updated_data.get("end_time"),
-                           "location": updated_data.get("location"),
-                           "reminder_minutes": updated_data.get("reminder_minutes"),
-                           "id": event_id
-                       }
-                       )
+        _update_event(cursor, event_id, updated_data)
         connection.commit()
-def get_events_to_notify(now_iso: str):
+
+def get_events_to_notify(now_ts: int):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
@@ -100,9 +260,9 @@ def get_events_to_notify(now_iso: str):
             WHERE 
                 is_notified = 0 
                 AND reminder_minutes IS NOT NULL
-                AND datetime(start_time, '-' || reminder_minutes || ' minutes') <= ?
+                AND start_ts - reminder_minutes * 60 <= ?
             """,
-            (now_iso,)
+            (now_ts,)
         )
         return [dict(row) for row in cursor.fetchall()]
 
@@ -110,4 +270,286 @@ def set_event_notified(event_id: int):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("UPDATE events SET is_notified = 1 WHERE id = ?", (event_id,))
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+
+# --- LƯU TRỮ & THU GỌN ---
+# Bảng events chỉ giữ các sự kiện còn "nóng" (sắp tới hoặc vừa kết thúc) để trang chủ
+# và truy vấn nhắc nhở luôn quét ít dòng. Sự kiện cũ được chuyển sang events_archive.
+
+def archive_past_events(now_ts: int, horizon_days: int = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    horizon_days = ARCHIVE_AFTER_DAYS if horizon_days is None else horizon_days
+    cutoff_ts = now_ts - horizon_days * 86400
+    archived = 0
+    connection = sqlite.connect(DATABASE_NAME)
+    connection.isolation_level = None
+    try:
+        cursor = connection.cursor()
+        while True:
+            # Mỗi lô là một transaction ngắn để không giữ khóa ghi lâu
+            cursor.execute("BEGIN IMMEDIATE")
+            ids = [row[0] for row in cursor.execute(
+                '''
+                SELECT id FROM events
+                WHERE COALESCE(end_ts, start_ts) < ?
+                LIMIT ?
+                ''',
+                (cutoff_ts, batch_size)
+            ).fetchall()]
+            if not ids:
+                cursor.execute("COMMIT")
+                break
+            placeholders = ",".join("?" * len(ids))
+            cursor.execute(
+                f"INSERT OR REPLACE INTO events_archive ({EVENT_COLUMNS}) "
+                f"SELECT {EVENT_COLUMNS} FROM events WHERE id IN ({placeholders})",
+                ids
+            )
+            cursor.execute(f"DELETE FROM events WHERE id IN ({placeholders})", ids)
+            _bump_data_version(cursor)
+            cursor.execute("COMMIT")
+            archived += len(ids)
+    except Exception:
+        if connection.in_transaction:
+            connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    return archived
+
+def get_archived_events(start_ts: int = None, end_ts: int = None, limit: int = 100):
+    query = "SELECT * FROM events_archive WHERE 1 = 1"
+    params = []
+    if start_ts is not None:
+        query += " AND start_ts >= ?"
+        params.append(start_ts)
+    if end_ts is not None:
+        query += " AND start_ts < ?"
+        params.append(end_ts)
+    query += " ORDER BY start_ts DESC LIMIT ?"
+    params.append(limit)
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+# Thời hạn giữ lượt bảo trì; nếu process chết giữa chừng, lượt được giải phóng sau thời hạn này
+MAINTENANCE_LEASE_SECONDS = 3600
+
+def claim_maintenance_run(now_ts: int, min_interval_seconds: int) -> bool:
+    # Giữ lượt bảo trì ngay trong database: nếu nhiều process (vd: reloader của Flask,
+    # nhiều worker) cùng đến giờ bảo trì thì chỉ process cập nhật được dòng này mới chạy.
+    # last_run_ts chỉ được ghi khi bảo trì xong (finish_maintenance_run).
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            '''
+            UPDATE maintenance_state SET claimed_until_ts = ?
+            WHERE id = 1 AND last_run_ts <= ? AND claimed_until_ts <= ?
+            ''',
+            (now_ts + MAINTENANCE_LEASE_SECONDS, now_ts - min_interval_seconds, now_ts)
+        )
+        connection.commit()
+        return cursor.rowcount == 1
+
+def finish_maintenance_run(run_ts: int):
+    with get_db_connection() as connection:
+        connection.execute(
+            "UPDATE maintenance_state SET last_run_ts = ?, claimed_until_ts = 0 WHERE id = 1",
+            (run_ts,)
+        )
+        connection.commit()
+
+def release_maintenance_claim():
+    # Bảo trì thất bại: bỏ lượt đang giữ để lần thử sau có thể chạy ngay
+    with get_db_connection() as connection:
+        connection.execute("UPDATE maintenance_state SET claimed_until_ts = 0 WHERE id = 1")
+        connection.commit()
+
+def compact_database(pages_per_step: int = 200, allow_full_vacuum: bool = False) -> dict:
+    # Thu hồi trang trống sau khi lưu trữ và cập nhật thống kê cho query planner.
+    # Với auto_vacuum=INCREMENTAL, việc thu hồi chia thành nhiều bước nhỏ nên
+    # các lệnh ghi khác chỉ phải chờ trong thời gian rất ngắn.
+    connection = sqlite.connect(DATABASE_NAME)
+    connection.isolation_level = None
+    try:
+        cursor = connection.cursor()
+        incremental = cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        full_vacuum = not incremental and allow_full_vacuum
+        if full_vacuum:
+            # Database cũ: VACUUM (khóa toàn bộ database trong lúc ghi lại) để bật
+            # auto_vacuum=INCREMENTAL. Chỉ chạy khi quản trị viên yêu cầu rõ ràng.
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+            pages_freed = None
+        elif not incremental:
+            # Database cũ chưa chuyển chế độ: chỉ cập nhật thống kê, không thu hồi trang
+            pages_freed = None
+        else:
+            start_pages = free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            while free_pages > 0:
+                cursor.execute(f"PRAGMA incremental_vacuum({pages_per_step})").fetchall()
+                remaining = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                if remaining >= free_pages:
+                    break
+                free_pages = remaining
+            pages_freed = start_pages - free_pages
+        cursor.execute("ANALYZE")
+        return {"full_vacuum": full_vacuum, "pages_freed": pages_freed}
+    finally:
+        connection.close()
+
+# --- GROUP COMMIT (TÙY CHỌN) ---
+# Khi có nhiều yêu cầu ghi đồng thời, mỗi lần commit riêng lẻ là một lần fsync
+# và các kết nối phải xếp hàng chờ khóa ghi của SQLite. GroupCommitWriter dùng
+# một luồng ghi duy nhất gom các thao tác trong hàng đợi và commit theo lô nhỏ,
+# giới hạn bởi số lượng (max_batch) và thời gian chờ (max_delay giây).
+
+class GroupCommitClosed(RuntimeError):
+    pass
+
+class GroupCommitWriter:
+    _STOP = object()
+
+    def __init__(self, database_name: str = None, max_batch: int = 64, max_delay: float = 0.005):
+        self.database_name = database_name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        # `_closed` và việc đưa vào hàng đợi dùng chung một khóa để không có thao tác nào lọt sau _STOP
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-group-commit", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # Các thao tác đã nằm trong hàng đợi vẫn được ghi trước khi luồng dừng
+        with self._lock:
+            if self._closed:
+                thread = self._thread
+            else:
+                self._closed = True
+                self._queue.put(self._STOP)
+                thread = self._thread
+        if thread is not None:
+            thread.join()
+            self._thread = None
+
+    def submit(self, operation, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise GroupCommitClosed("GroupCommitWriter đã dừng.")
+            if self._thread is None:
+                raise GroupCommitClosed("GroupCommitWriter chưa được khởi động.")
+            self._queue.put((operation, args, future))
+        return future
+
+    def add_event(self, event_data: dict) -> Future:
+        return self.submit(_insert_event, event_data)
+
+    def update_event(self, event_id: int, updated_data: dict) -> Future:
+        return self.submit(_update_event, event_id, updated_data)
+
+    def delete_event(self, event_id: int) -> Future:
+        return self.submit(_delete_event, event_id)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        if batch[0] is self._STOP:
+            return [], True
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        error = None
+        try:
+            connection = sqlite.connect(self.database_name or DATABASE_NAME)
+            # Tự quản lý transaction (BEGIN/COMMIT) thay vì để sqlite3 tự mở
+            connection.isolation_level = None
+            try:
+                stopping = False
+                while not stopping:
+                    batch, stopping = self._collect_batch()
+                    if batch:
+                        self._write_batch(connection, batch)
+            finally:
+                connection.close()
+        except Exception as e:
+            error = e
+            print(f"Lỗi trong luồng group commit: {e}")
+        finally:
+            self._fail_pending(error)
+
+    def _fail_pending(self, error):
+        # Luồng ghi kết thúc (bình thường hoặc do lỗi): không nhận thêm thao tác
+        # và trả lỗi cho mọi future còn trong hàng đợi để người gọi không chờ mãi.
+        with self._lock:
+            self._closed = True
+        error = error or GroupCommitClosed("GroupCommitWriter đã dừng trước khi ghi thao tác này.")
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._STOP:
+                item[2].set_exception(error)
+
+    def _write_batch(self, connection, batch):
+        cursor = connection.cursor()
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for operation, args, future in batch:
+                # Mỗi thao tác có savepoint riêng: một thao tác lỗi không làm hỏng cả lô
+                cursor.execute("SAVEPOINT op")
+                try:
+                    results.append((future, operation(cursor, *args), None))
+                    cursor.execute("RELEASE op")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO op")
+                    cursor.execute("RELEASE op")
+                    results.append((future, None, e))
+            cursor.execute("COMMIT")
+        except Exception as e:
+            if connection.in_transaction:
+                connection.rollback()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        # Chỉ trả kết quả cho người gọi sau khi lô đã commit xong
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+_group_writer = None
+
+def enable_group_commit(max_batch: int = 64, max_delay: float = 0.005) -> GroupCommitWriter:
+    """Chuyển add_event/update_event/delete_event sang ghi theo lô qua một luồng ghi duy nhất."""
+    global _group_writer
+    if _group_writer is None:
+        _group_writer = GroupCommitWriter(max_batch=max_batch, max_delay=max_delay).start()
+    return _group_writer
+
+def disable_group_commit():
+    global _group_writer
+    writer, _group_writer = _group_writer, None
+    if writer is not None:
+        writer.stop()
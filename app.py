@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, make_response, g, jsonify
 import threading
 import time
 import queue
@@ -7,71 +7,229 @@ from datetime import time as dt_time
 import json
 import os  # KHẮC PHỤC: Thêm import os
 import html # KHẮC PHỤC: Thêm import html
+import gzip
+import hashlib
+import click
+
+try:
+    import brotli  # Tùy chọn: chỉ dùng nếu đã cài gói `brotli`
+except ImportError:
+    brotli = None
 
 # Import các module cốt lõi của bạn
 import nlp_parser
+import clock
 from Database import database as db
 
 app = Flask(__name__)
 # KHẮC PHỤC BẢO MẬT: Sử dụng secret key an toàn
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
+# Asset tĩnh được gắn phiên bản (?v=<hash>) nên có thể cache dài hạn ở trình duyệt
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = timedelta(days=365)
+
+# Chỉ nén phản hồi đủ lớn; các phản hồi nhỏ hơn không đáng tốn CPU
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+
+# Số sự kiện mỗi trang trong bảng danh sách: HTML của trang chủ không lớn dần theo dữ liệu
+EVENTS_PER_PAGE = 20
+# Số khoảng thời gian (start/end của FullCalendar) giữ trong cache payload lịch
+CALENDAR_CACHE_MAX_RANGES = 64
+
+# Giờ thấp điểm (theo múi giờ mặc định) để chạy lưu trữ + thu gọn database mỗi ngày;
+# chỉ chạy trong khung [MAINTENANCE_HOUR, MAINTENANCE_HOUR + MAINTENANCE_WINDOW_HOURS)
+MAINTENANCE_HOUR = int(os.environ.get('MAINTENANCE_HOUR', 3))
+MAINTENANCE_WINDOW_HOURS = int(os.environ.get('MAINTENANCE_WINDOW_HOURS', 2))
+# Đặt MAINTENANCE_ENABLED=0 để tắt luồng bảo trì (vd: khi test hoặc benchmark)
+MAINTENANCE_ENABLED = os.environ.get('MAINTENANCE_ENABLED', '1') == '1'
 
 # --- 1. HỆ THỐNG NHẮC NHỞ (BACKGROUND THREAD) ---
 notification_queue = queue.Queue()
 
+def check_reminders(notif_queue, now_utc: datetime):
+    # So sánh theo epoch UTC nên không phụ thuộc múi giờ của server
+    now_ts = int(now_utc.timestamp())
+
+    # 1. KIỂM TRA: Gọi DB để tìm sự kiện cần nhắc
+    events_to_notify = db.get_events_to_notify(now_ts)
+    
+    for event in events_to_notify:
+        # 2. GỬI THÔNG BÁO: Đẩy tên sự kiện vào "hàng đợi"
+        notif_queue.put(event['event'])
+        
+        # 3. ĐÁNH DẤU: Đánh dấu là đã nhắc
+        db.set_event_notified(event['id'])
+    return len(events_to_notify)
+
 def reminder_checker(notif_queue):
     print("Luồng nhắc nhở đã bắt đầu...")
     while True:
         try:
-            # KHẮC PHỤC LỖI DB: Chuyển sang định dạng SQLite-friendly (YYYY-MM-DD HH:MM:SS)
-            now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 1. KIỂM TRA: Gọi DB để tìm sự kiện cần nhắc
-            events_to_notify = db.get_events_to_notify(now_str)
-            
-            for event in events_to_notify:
-                # 2. GỬI THÔNG BÁO: Đẩy tên sự kiện vào "hàng đợi"
-                notif_queue.put(event['event'])
-                
-                # 3. ĐÁNH DẤU: Đánh dấu là đã nhắc
-                db.set_event_notified(event['id'])
-                
+            check_reminders(notif_queue, clock.default_clock.now())
         except Exception as e:
             print(f"Lỗi trong luồng nhắc nhở: {e}")
         
         # 4. ĐỊNH KỲ: Ngủ 60 giây
         time.sleep(60)
 
+# --- BẢO TRÌ DATABASE (BACKGROUND THREAD) ---
+# Lượt bảo trì theo lịch được "giành" qua db.claim_maintenance_run, nên dù có nhiều
+# process cùng chạy luồng này thì mỗi ngày cũng chỉ một process thực hiện.
+MAINTENANCE_MIN_INTERVAL = 12 * 3600
+# Lượt bảo trì lỗi được thử lại sau khoảng này nếu vẫn còn trong khung giờ thấp điểm
+MAINTENANCE_RETRY_SECONDS = 10 * 60
+
+def run_maintenance(now_utc: datetime, full_vacuum: bool = False):
+    archived = db.archive_past_events(int(now_utc.timestamp()))
+    stats = db.compact_database(allow_full_vacuum=full_vacuum)
+    print(f"Bảo trì database: lưu trữ {archived} sự kiện, {stats}")
+
+def run_scheduled_maintenance(min_interval_seconds: int = MAINTENANCE_MIN_INTERVAL) -> bool:
+    now_utc = clock.default_clock.now()
+    now_ts = int(now_utc.timestamp())
+    if not db.claim_maintenance_run(now_ts, min_interval_seconds):
+        return False
+    try:
+        run_maintenance(now_utc)
+    except Exception:
+        # Trả lại lượt để lần thử sau (của process này hoặc process khác) có thể chạy
+        db.release_maintenance_claim()
+        raise
+    # Chỉ ghi nhận lần chạy sau khi bảo trì thành công
+    db.finish_maintenance_run(now_ts)
+    return True
+
+def in_maintenance_window(now_utc: datetime) -> bool:
+    now_local = now_utc.astimezone(clock.get_zone(clock.DEFAULT_TIMEZONE))
+    window_start = now_local.replace(hour=MAINTENANCE_HOUR, minute=0, second=0, microsecond=0)
+    if window_start > now_local:
+        window_start -= timedelta(days=1)
+    return now_local - window_start < timedelta(hours=MAINTENANCE_WINDOW_HOURS)
+
+def seconds_until_maintenance(now_utc: datetime) -> float:
+    now_local = now_utc.astimezone(clock.get_zone(clock.DEFAULT_TIMEZONE))
+    next_run = now_local.replace(hour=MAINTENANCE_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now_local:
+        next_run += timedelta(days=1)
+    return (next_run - now_local).total_seconds()
+
+def maintenance_worker():
+    print("Luồng bảo trì database đã bắt đầu...")
+    while True:
+        now_utc = clock.default_clock.now()
+        # Ngoài khung giờ thấp điểm thì chỉ chờ đến khung kế tiếp, kể cả ngay sau khi khởi động
+        delay = seconds_until_maintenance(now_utc)
+        if in_maintenance_window(now_utc):
+            try:
+                run_scheduled_maintenance()
+            except Exception as e:
+                print(f"Lỗi trong luồng bảo trì: {e}")
+                delay = MAINTENANCE_RETRY_SECONDS
+        time.sleep(delay)
+
+_maintenance_thread = None
+_maintenance_thread_lock = threading.Lock()
+
+@app.before_request
+def start_maintenance_thread():
+    # Khởi động ở request đầu tiên thay vì lúc import: process cha của reloader
+    # (app.run(debug=True)) không phục vụ request nên không chạy bảo trì.
+    global _maintenance_thread
+    if MAINTENANCE_ENABLED and _maintenance_thread is None:
+        with _maintenance_thread_lock:
+            if _maintenance_thread is None:
+                _maintenance_thread = threading.Thread(target=maintenance_worker, daemon=True)
+                _maintenance_thread.start()
+
+@app.cli.command('maintenance')
+@click.option('--full-vacuum', is_flag=True,
+              help="Chạy VACUUM toàn bộ để chuyển database cũ sang auto_vacuum=INCREMENTAL (khóa database trong lúc chạy).")
+def maintenance_command(full_vacuum):
+    """Lưu trữ sự kiện cũ và thu gọn database ngay lập tức."""
+    run_maintenance(clock.default_clock.now(), full_vacuum=full_vacuum)
+
 # Initialize the reminder thread when the app starts
 with app.app_context():
     db.init_db()
+    # Tùy chọn: gom các lệnh ghi thành lô khi có nhiều người dùng thêm sự kiện cùng lúc
+    if os.environ.get('DB_GROUP_COMMIT') == '1':
+        db.enable_group_commit()
     thread = threading.Thread(target=reminder_checker, args=(notification_queue,), daemon=True)
     thread.start()
 
-# --- 2. ROUTES ---
-@app.route('/', methods=['GET'])
-def index():
-    all_events_db = db.get_all_events()
-    app.logger.info(f"Dữ liệu sự kiện từ cơ sở dữ liệu: {all_events_db}")
+# --- 2. MÚI GIỜ & THỜI ĐIỂM CỦA REQUEST ---
+@app.before_request
+def bind_request_now():
+    # Mỗi request chỉ lấy "bây giờ" một lần; mọi phép tính thời gian trong request dùng chung giá trị này
+    g.now_utc = clock.default_clock.now()
+
+def current_timezone() -> str:
+    return session.get('timezone') or clock.DEFAULT_TIMEZONE
+
+def remember_timezone(tz_name: str):
+    # Múi giờ do trình duyệt gửi lên (Intl API); bỏ qua nếu không hợp lệ
+    if tz_name and clock.is_valid_zone(tz_name):
+        session['timezone'] = tz_name
+
+def request_now(tz_name: str = None) -> datetime:
+    return g.now_utc.astimezone(clock.get_zone(tz_name or current_timezone()))
+
+# --- 3. NÉN & CACHE PHẢN HỒI ---
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+def choose_encoding():
+    offers = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offers)
 
+@app.after_request
+def compress_response(response):
+    # Nén HTML/JSON khi trình duyệt hỗ trợ (bỏ qua file tĩnh và phản hồi đã nén)
+    if (response.direct_passthrough
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding:
+        response.set_data(compress_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Cache asset tĩnh: tên file -> hash nội dung (dùng làm tham số phiên bản trong URL)
+_asset_versions = {}
+
+def asset_url(filename: str) -> str:
+    version = _asset_versions.get(filename)
+    if version is None or app.debug:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            version = hashlib.md5(f.read()).hexdigest()[:10]
+        _asset_versions[filename] = version
+    return url_for('static', filename=filename, v=version)
+
+@app.context_processor
+def inject_asset_url():
+    return {"asset_url": asset_url}
+
+def build_calendar_events(all_events_db):
     # Chuẩn bị dữ liệu cho lịch (Python list)
     calendar_events = []
     for event in all_events_db:
-        try:
-            # KHẮC PHỤC LỖI DB: Đọc từ định dạng 'YYYY-MM-DD HH:MM:SS'
-            start_dt = datetime.strptime(event['start_time'], '%Y-%m-%d %H:%M:%S')
-            # JavaScript (FullCalendar) cần định dạng ISO 8601
-            start_iso_for_js = start_dt.isoformat() 
-        except (ValueError, TypeError):
+        if event['start_ts'] is None:
             continue  # Bỏ qua sự kiện lỗi
 
-        if event['end_time']:
-            try:
-                # KHẮC PHỤC LỖI DB: Đọc từ định dạng 'YYYY-MM-DD HH:MM:SS'
-                end_dt = datetime.strptime(event['end_time'], '%Y-%m-%d %H:%M:%S')
-                end_dt_iso = end_dt.isoformat() # JS cần ISO
-            except (ValueError, TypeError):
-                end_dt_iso = (start_dt + timedelta(hours=1)).isoformat()
+        # Đọc từ epoch UTC, xuất ISO 8601 kèm offset để FullCalendar tự đổi sang giờ của trình duyệt
+        start_dt = clock.epoch_to_local(event['start_ts'], event['timezone'])
+        start_iso_for_js = start_dt.isoformat()
+
+        if event['end_ts'] is not None:
+            end_dt_iso = clock.epoch_to_local(event['end_ts'], event['timezone']).isoformat()
         else:
             end_dt_iso = (start_dt + timedelta(hours=1)).isoformat()
 
@@ -85,10 +243,110 @@ def index():
                 "reminder": f"{event['reminder_minutes']} phút trước"
             }
         })
-        
+    return calendar_events
+
+# Cache payload JSON của lịch theo từng khoảng (start_ts, end_ts), đã serialize + đã nén.
+# Toàn bộ cache được làm mới khi db.get_data_version() (bộ đếm lưu trong database) thay đổi,
+# kể cả khi process khác ghi dữ liệu.
+_calendar_cache = {"version": None, "ranges": {}}
+_calendar_cache_lock = threading.Lock()
+
+def get_calendar_payload(start_ts: int = None, end_ts: int = None) -> dict:
+    with _calendar_cache_lock:
+        version = db.get_data_version()
+        if _calendar_cache["version"] != version:
+            _calendar_cache["version"] = version
+            _calendar_cache["ranges"] = {}
+        ranges = _calendar_cache["ranges"]
+        key = (start_ts, end_ts)
+        payload = ranges.get(key)
+        if payload is None:
+            if start_ts is None or end_ts is None:
+                events_db = db.get_all_events()
+            else:
+                events_db = db.get_events_for_range(start_ts, end_ts)
+            body = json.dumps(build_calendar_events(events_db), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            payload = {"etag": hashlib.sha1(body).hexdigest(), "bodies": {None: body}}
+            if len(ranges) >= CALENDAR_CACHE_MAX_RANGES:
+                ranges.clear()
+            ranges[key] = payload
+        return payload
+
+def get_calendar_body(payload: dict, encoding):
+    # Bản nén được tạo lần đầu khi có trình duyệt yêu cầu rồi giữ lại trong cache
+    with _calendar_cache_lock:
+        bodies = payload["bodies"]
+        if encoding not in bodies:
+            bodies[encoding] = compress_body(bodies[None], encoding)
+        return bodies[encoding]
+
+def parse_range_param(value: str):
+    # FullCalendar gửi start/end dạng ISO 8601 (có hoặc không kèm offset);
+    # không có offset thì hiểu theo múi giờ của người dùng
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace(' ', '+'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=clock.get_zone(current_timezone()))
+    return int(dt.timestamp())
+
+# --- 4. ROUTES ---
+@app.route('/api/events', methods=['GET'])
+def calendar_events_feed():
+    # Chỉ trả về sự kiện trong khung nhìn FullCalendar yêu cầu (?start=...&end=...)
+    start_ts = parse_range_param(request.args.get('start'))
+    end_ts = parse_range_param(request.args.get('end'))
+    payload = get_calendar_payload(start_ts, end_ts)
+    encoding = choose_encoding()
+    # ETag riêng cho từng kiểu nén để cache trung gian không trộn lẫn các biến thể
+    etag = f"{payload['etag']}-{encoding}" if encoding else payload['etag']
+
+    response = make_response(get_calendar_body(payload, encoding))
+    response.mimetype = 'application/json'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    # Luôn xác thực lại với server, nhưng nhận 304 nếu dữ liệu chưa đổi
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/archive', methods=['GET'])
+def archived_events():
+    # Tra cứu sự kiện đã lưu trữ: ?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=N (ngày theo múi giờ người dùng)
+    zone = clock.get_zone(current_timezone())
+    bounds = []
+    for param in ('from', 'to'):
+        value = request.args.get(param)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=zone)
+        except ValueError:
+            return jsonify({"error": f"Tham số '{param}' phải có dạng YYYY-MM-DD."}), 400
+        if param == 'to':
+            day += timedelta(days=1)  # 'to' tính cả ngày đó
+        bounds.append(int(day.timestamp()))
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+
+    events = db.get_archived_events(bounds[0], bounds[1], limit)
+    return jsonify(events)
+
+@app.route('/', methods=['GET'])
+def index():
+    # Trang chủ chỉ chứa một trang của bảng danh sách; dữ liệu lịch tải riêng qua /api/events
+    total_pages = max(1, -(-db.count_events() // EVENTS_PER_PAGE))
+    page = min(max(1, request.args.get('page', 1, type=int)), total_pages)
+    page_events_db = db.get_events_page((page - 1) * EVENTS_PER_PAGE, EVENTS_PER_PAGE)
+    app.logger.debug(f"Dữ liệu sự kiện trang {page}: {page_events_db}")
+
     # Chuẩn bị dữ liệu cho danh sách sự kiện (hiển thị table)
     events = []
-    for event in all_events_db:
+    for event in page_events_db:
         ev = event.copy()
         try:
             # KHẮC PHỤC LỖI DB: Đọc từ định dạng 'YYYY-MM-DD HH:MM:SS'
@@ -107,16 +365,13 @@ def index():
     editing_event_id = session.get('editing_event_id')
     edited_event = None
     if editing_event_id:
-        for e in all_events_db:
-            if e['id'] == editing_event_id:
-                edited_event = e.copy()
-                break
+        edited_event = db.get_event(editing_event_id)
         if edited_event:
             try:
                 # KHẮC PHỤC LỖI DB: Đọc từ định dạng 'YYYY-MM-DD HH:MM:SS'
                 start_dt = datetime.strptime(edited_event['start_time'], '%Y-%m-%d %H:%M:%S')
             except ValueError:
-                start_dt = datetime.now()
+                start_dt = request_now(edited_event['timezone']).replace(tzinfo=None)
             edited_event['start_date'] = start_dt.date().isoformat()
             edited_event['start_time_of_day'] = start_dt.time().strftime('%H:%M')
 
@@ -147,28 +402,34 @@ def index():
         events=events,
         editing_event_id=editing_event_id,
         edited_event=edited_event,
-        # KHẮC PHỤC JAVASCRIPT: Truyền list Python trực tiếp
-        calendar_events=calendar_events,
-        reminder_messages=reminder_messages
+        reminder_messages=reminder_messages,
+        page=page,
+        total_pages=total_pages
     )
 
 @app.route('/add', methods=['POST'])
 def add_event():
     nlp_input = request.form.get('nlp_input')
+    remember_timezone(request.form.get('timezone'))
+    tz_name = current_timezone()
     if nlp_input:
-        parsed_data = nlp_parser.parse_sentence(nlp_input)
+        parsed_data = nlp_parser.parse_sentence(nlp_input, now=request_now(tz_name))
         if "error" in parsed_data:
             flash(f"Lỗi phân tích: {parsed_data['error']}", 'error')
         else:
             try:
-                # KHẮC PHỤC LỖI DB: Chuyển đổi thời gian (từ ISO) sang định dạng SQLite-friendly
+                # KHẮC PHỤC LỖI DB: Chuyển đổi thời gian (từ ISO) sang giờ địa phương của người dùng;
+                # database tự tính epoch UTC từ giờ địa phương + múi giờ
+                zone = clock.get_zone(tz_name)
                 if parsed_data.get('start_time'):
-                    start_dt = datetime.fromisoformat(parsed_data['start_time'])
-                    parsed_data['start_time'] = start_dt.strftime('%Y-%m-%d %H:%M:%S')
+                    start_dt = datetime.fromisoformat(parsed_data['start_time']).astimezone(zone)
+                    parsed_data['start_time'] = start_dt.strftime(clock.LOCAL_TIME_FORMAT)
                 
                 if parsed_data.get('end_time'):
-                    end_dt = datetime.fromisoformat(parsed_data['end_time'])
-                    parsed_data['end_time'] = end_dt.strftime('%Y-%m-%d %H:%M:%S')
+                    end_dt = datetime.fromisoformat(parsed_data['end_time']).astimezone(zone)
+                    parsed_data['end_time'] = end_dt.strftime(clock.LOCAL_TIME_FORMAT)
+
+                parsed_data['timezone'] = tz_name
 
                 event_id = db.add_event(parsed_data)
                 
@@ -185,7 +446,8 @@ def add_event():
 @app.route('/edit/<int:event_id>', methods=['GET'])
 def edit_event(event_id):
     session['editing_event_id'] = event_id
-    return redirect(url_for('index'))
+    # Quay lại đúng trang đang xem để form chỉnh sửa hiện trong bảng
+    return redirect(url_for('index', page=request.args.get('page', 1, type=int)))
 
 @app.route('/cancel_edit', methods=['GET'])
 def cancel_edit():
@@ -196,6 +458,11 @@ def cancel_edit():
 def update_event(event_id):
     updated_data = {}
     updated_data['event'] = request.form['event']
+    # Giữ múi giờ gốc của sự kiện: form hiển thị giờ địa phương theo múi giờ đó
+    event_timezone = request.form.get('timezone')
+    if not (event_timezone and clock.is_valid_zone(event_timezone)):
+        event_timezone = current_timezone()
+    updated_data['timezone'] = event_timezone
     
     start_date_str = request.form['start_date']
     start_time_str = request.form['start_time']
@@ -233,7 +500,7 @@ def update_event(event_id):
 
 @app.route('/delete/<int:event_id>', methods=['POST'])
 def delete_event_route(event_id):
-    event = next((e for e in db.get_all_events() if e['id'] == event_id), None)
+    event = db.get_event(event_id)
     if event:
         db.delete_event(event_id)
         
@@ -0,0 +1,57 @@
+# So sánh thông lượng ghi: commit từng lệnh (mặc định) và group commit.
+# Chạy: python benchmarks/bench_group_commit.py [số_luồng] [số_sự_kiện_mỗi_luồng]
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Database import database as db
+
+
+def run(label: str, threads: int, per_thread: int):
+    db.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_db()
+    if label == "group-commit":
+        db.enable_group_commit()
+
+    errors = []
+
+    def worker(worker_id: int):
+        for i in range(per_thread):
+            try:
+                db.add_event({
+                    "event": f"onboarding {worker_id}-{i}",
+                    "start_time": "2025-01-01 09:00:00",
+                    "end_time": None,
+                    "location": None,
+                    "reminder_minutes": 15,
+                })
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    begin = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - begin
+    db.disable_group_commit()
+
+    total = threads * per_thread
+    print(f"[{label}] {total} sự kiện trong {elapsed:.2f}s -> {total / elapsed:.0f} sự kiện/s, "
+          f"lỗi: {len(errors)}, số dòng: {len(db.get_all_events())}")
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run("per-call commit", threads, per_thread)
+    run("group-commit", threads, per_thread)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Đo số byte truyền tải và thời gian phục vụ trang chủ + dữ liệu lịch.
+# Chạy: python benchmarks/bench_index_payload.py [số_sự_kiện]
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Không để luồng bảo trì lưu trữ dữ liệu benchmark giữa chừng
+os.environ['MAINTENANCE_ENABLED'] = '0'
+
+import clock
+from Database import database as db
+
+# Dùng database tạm để không đụng vào dữ liệu thật
+db.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+import app as app_module  # noqa: E402  (phải import sau khi đổi DATABASE_NAME)
+
+
+def seed(count: int):
+    # Các sự kiện trải đều quanh thời điểm hiện tại (trong hạn lưu trữ) để không bị lưu trữ
+    now_local = clock.default_clock.now(clock.DEFAULT_TIMEZONE).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    start = now_local - timedelta(hours=count * 5 // 2)
+    for i in range(count):
+        start_dt = start + timedelta(hours=i * 5)
+        db.add_event({
+            "event": f"họp nhóm dự án số {i}",
+            "start_time": start_dt.strftime(clock.LOCAL_TIME_FORMAT),
+            "end_time": (start_dt + timedelta(hours=1)).strftime(clock.LOCAL_TIME_FORMAT),
+            "location": f"phòng {300 + i % 20}",
+            "reminder_minutes": 15,
+            "timezone": clock.DEFAULT_TIMEZONE,
+        })
+
+
+def month_range():
+    # Khung nhìn tháng hiện tại như FullCalendar gửi (?start=...&end=...)
+    now_local = clock.default_clock.now(clock.DEFAULT_TIMEZONE)
+    start = now_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return {"start": start.isoformat(), "end": end.isoformat()}
+
+
+def timed(fn, repeat: int = 50):
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - begin) / repeat * 1000, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seed(count)
+    client = app_module.app.test_client()
+    view = month_range()
+
+    full_json = json.dumps(app_module.build_calendar_events(db.get_all_events()), ensure_ascii=False).encode('utf-8')
+    print(f"{count} sự kiện; JSON toàn bộ lịch: {len(full_json)} bytes "
+          f"({len(gzip.compress(full_json))} bytes gzip)")
+
+    for encoding in ('identity', 'gzip', 'br'):
+        headers = {'Accept-Encoding': encoding}
+        page = client.get('/', headers=headers)
+        feed = client.get('/api/events', query_string=view, headers=headers)
+        print(f"[{encoding}] HTML trang 1: {len(page.get_data())} bytes, "
+              f"/api/events (tháng hiện tại, {len(json.loads(client.get('/api/events', query_string=view).get_data()))} sự kiện): "
+              f"{len(feed.get_data())} bytes (Content-Encoding={feed.headers.get('Content-Encoding', 'identity')})")
+
+    etag = client.get('/api/events', query_string=view, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    revalidated = client.get('/api/events', query_string=view,
+                             headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    print(f"Tải lại khi dữ liệu không đổi: HTTP {revalidated.status_code}, {len(revalidated.get_data())} bytes")
+
+    def cold():
+        app_module._calendar_cache["version"] = None
+        return client.get('/api/events', query_string=view, headers={'Accept-Encoding': 'gzip'})
+
+    cold_ms, _ = timed(cold)
+    warm_ms, _ = timed(lambda: client.get('/api/events', query_string=view, headers={'Accept-Encoding': 'gzip'}))
+    page_ms, _ = timed(lambda: client.get('/', headers={'Accept-Encoding': 'gzip'}))
+    print(f"/api/events: không cache {cold_ms:.2f} ms/req, có cache {warm_ms:.2f} ms/req")
+    print(f"/: {page_ms:.2f} ms/req; trang + lịch (phía server): {page_ms + warm_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
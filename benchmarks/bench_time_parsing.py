@@ -0,0 +1,64 @@
+# Đo thời gian phân tích thời gian tiếng Việt và một vòng kiểm tra nhắc nhở
+# với đồng hồ cố định (FixedClock) để kết quả lặp lại được giữa các lần chạy.
+# Chạy: python benchmarks/bench_time_parsing.py
+import os
+import queue
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock
+from Database import database as db
+
+db.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+import nlp_parser  # noqa: E402
+import app as app_module  # noqa: E402  (phải import sau khi đổi DATABASE_NAME)
+
+# Thứ 4, 01/01/2025 20:00 giờ Việt Nam (13:00 UTC)
+FIXED_NOW = datetime(2025, 1, 1, 13, 0, 0, tzinfo=timezone.utc)
+
+TIME_TEXTS = [
+    "10 giờ sáng ngày_mai",
+    "8h tối thứ_2 tới",
+    "9h30 sáng ngày_mai",
+    "2h chiều thứ_6 này",
+    "9h sáng thứ_5 tuần_sau",
+    "8h sáng ngày_kia",
+    "11h tối hôm_nay",
+]
+
+
+def bench_parser(repeat: int = 2000):
+    now = clock.FixedClock(FIXED_NOW).now("Asia/Ho_Chi_Minh")
+    for text in TIME_TEXTS:
+        print(f"  {text!r:32} -> {nlp_parser.parse_vietnamese_time(text, now).isoformat()}")
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        for text in TIME_TEXTS:
+            nlp_parser.parse_vietnamese_time(text, now)
+    elapsed = time.perf_counter() - begin
+    print(f"parse_vietnamese_time: {elapsed / (repeat * len(TIME_TEXTS)) * 1e6:.1f} µs/lần")
+
+
+def bench_reminders(count: int = 2000):
+    start = FIXED_NOW.astimezone(clock.get_zone("Asia/Ho_Chi_Minh")).replace(tzinfo=None)
+    for i in range(count):
+        db.add_event({
+            "event": f"sự kiện {i}",
+            "start_time": (start + timedelta(minutes=i)).strftime(clock.LOCAL_TIME_FORMAT),
+            "reminder_minutes": 15,
+            "timezone": "Asia/Ho_Chi_Minh",
+        })
+    begin = time.perf_counter()
+    fired = app_module.check_reminders(queue.Queue(), FIXED_NOW)
+    elapsed = time.perf_counter() - begin
+    print(f"check_reminders: {fired} nhắc nhở trong {elapsed * 1000:.1f} ms ({count} sự kiện)")
+
+
+if __name__ == '__main__':
+    bench_parser()
+    bench_reminders()
@@ -0,0 +1,69 @@
+# clock.py - Nguồn thời gian dùng chung cho parser, scheduler và app.
+#
+# Mọi thời điểm "bây giờ" đều lấy qua một đối tượng clock (mặc định là
+# SystemClock) để có thể thay bằng FixedClock khi test hoặc benchmark.
+
+import os
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Múi giờ mặc định cho người dùng chưa gửi múi giờ của trình duyệt
+DEFAULT_TIMEZONE = os.environ.get('DEFAULT_TIMEZONE', 'Asia/Ho_Chi_Minh')
+
+# Định dạng lưu giờ địa phương (wall-clock) trong cột start_time/end_time
+LOCAL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def get_zone(name: str = None) -> ZoneInfo:
+    # Tên múi giờ không hợp lệ (hoặc rỗng) thì quay về múi giờ mặc định
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def is_valid_zone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def local_to_epoch(local_str: str, tz_name: str = None):
+    # 'YYYY-MM-DD HH:MM:SS' theo giờ địa phương của tz_name -> epoch UTC (giây)
+    if not local_str:
+        return None
+    try:
+        local_dt = datetime.strptime(local_str, LOCAL_TIME_FORMAT)
+    except (ValueError, TypeError):
+        return None
+    return int(local_dt.replace(tzinfo=get_zone(tz_name)).timestamp())
+
+
+def epoch_to_local(ts: int, tz_name: str = None) -> datetime:
+    return datetime.fromtimestamp(ts, get_zone(tz_name))
+
+
+class SystemClock:
+    def now(self, tz_name: str = None) -> datetime:
+        # Luôn trả về datetime có múi giờ (UTC nếu không chỉ định)
+        if tz_name:
+            return datetime.now(get_zone(tz_name))
+        return datetime.now(timezone.utc)
+
+
+class FixedClock:
+    def __init__(self, fixed: datetime):
+        if fixed.tzinfo is None:
+            raise ValueError("FixedClock cần datetime có múi giờ.")
+        self.fixed = fixed
+
+    def now(self, tz_name: str = None) -> datetime:
+        if tz_name:
+            return self.fixed.astimezone(get_zone(tz_name))
+        return self.fixed.astimezone(timezone.utc)
+
+
+# Clock dùng chung; test/benchmark có thể gán `clock.default_clock = FixedClock(...)`
+default_clock = SystemClock()
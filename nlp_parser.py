@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 from underthesea import word_tokenize, ner
 from dateutil.parser import parse as dateutil_parse
 
+import clock
+
 def preprocess(text: str) -> str:
     text = text.lower().strip()
     text = re.sub(r'\s+',' ', text)
@@ -158,11 +160,14 @@ def extract_rule_entities(original_text: str, remaining_text: str) -> dict:
 #
     
 
-def parse_vietnamese_time(time_text: str) -> datetime:
+def parse_vietnamese_time(time_text: str, now: datetime = None) -> datetime:
+    # `now` là thời điểm hiện tại theo múi giờ của người dùng (datetime có tzinfo);
+    # các cụm tương đối như "mai", "thứ 6 tuần sau" được tính theo ngày của múi giờ đó.
     if not time_text:
         return None
     
-    now = datetime.now()
+    if now is None:
+        now = clock.default_clock.now(clock.DEFAULT_TIMEZONE)
     text = time_text.lower()
 
     base_date = now
@@ -287,11 +292,15 @@ def parse_vietnamese_time(time_text: str) -> datetime:
             if minute_match:
                 minute = int(minute_match.group(1))
 
-        return base_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        result = base_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        # Đảm bảo kết quả luôn mang múi giờ của người dùng
+        if result.tzinfo is None:
+            result = result.replace(tzinfo=now.tzinfo)
+        return result
     except ValueError:
         return None
 
-def parse_sentence(sentence: str) -> dict:
+def parse_sentence(sentence: str, now: datetime = None) -> dict:
     if not sentence:
         return {"error": "Câu rỗng."}
 
@@ -307,7 +316,7 @@ def parse_sentence(sentence: str) -> dict:
 
     # 4. Time Parsing
     time_text = ner_entities["TIME"][0] if ner_entities["TIME"] else None
-    start_time_dt = parse_vietnamese_time(time_text)
+    start_time_dt = parse_vietnamese_time(time_text, now)
     
     start_time_iso = None
     end_time_iso = None # <--- THAY ĐỔI (Khởi tạo là None)
@@ -324,7 +333,7 @@ def parse_sentence(sentence: str) -> dict:
     else:
         # Nếu NER không tìm thấy TIME, thử phân tích toàn bộ câu
         # Đây là một cải tiến nhỏ nếu NER thất bại
-        start_time_dt = parse_vietnamese_time(text)
+        start_time_dt = parse_vietnamese_time(text, now)
         if start_time_dt:
              start_time_iso = start_time_dt.isoformat()
              # Thử lại logic duration
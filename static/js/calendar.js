@@ -0,0 +1,31 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Gửi múi giờ của trình duyệt để server hiểu "mai", "tối nay"... theo giờ của người dùng
+    var browserTimeZone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    document.querySelectorAll('input[name="timezone"]').forEach(function(input) {
+        if (!input.value && browserTimeZone) {
+            input.value = browserTimeZone;
+        }
+    });
+
+    var calendarEl = document.getElementById('calendar');
+
+    // Dữ liệu sự kiện được tải riêng từ /api/events (JSON đã nén, có ETag)
+    // thay vì nhúng vào HTML, để trang và dữ liệu được cache độc lập.
+    var calendar = new FullCalendar.Calendar(calendarEl, {
+        headerToolbar: {
+            left: 'prev,next today',
+            center: 'title',
+            right: 'dayGridMonth,timeGridWeek,timeGridDay'
+        },
+        initialView: 'dayGridMonth',
+        selectable: true,
+        editable: true,
+        events: {
+            url: calendarEl.dataset.eventsUrl,
+            failure: function() {
+                console.error("Không tải được dữ liệu lịch.");
+            }
+        }
+    });
+    calendar.render();
+});